@@ -0,0 +1,58 @@
+# compares the ivf index against the exact flat scan on synthetic clustered vectors
+# run with: python -m benchmarks.ann_bench
+import json
+import time
+import numpy as np
+
+from utils.ann import FlatIndex, IVFIndex
+
+DIM = 384  # all-MiniLM-L6-v2 output size
+
+
+def make_vectors(n: int, dim: int = DIM, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    # real column values cluster (typos, shared prefixes) so uniform noise would flatter nothing
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    return centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def build(index, vectors: np.ndarray) -> float:
+    keys = [str(i) for i in range(len(vectors))]
+    start = time.perf_counter()
+    # insert in chunks to exercise the incremental path
+    for i in range(0, len(vectors), 1000):
+        index.add_batch(keys[i:i + 1000], keys[i:i + 1000], vectors[i:i + 1000])
+    return time.perf_counter() - start
+
+
+def query_latency(index, queries: np.ndarray):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append(index.search(q, k=1)[0][0])
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def run(sizes=(1000, 10000, 50000), nprobes=(1, 4, 8, 16), n_queries: int = 200):
+    report = []
+    for n in sizes:
+        vectors = make_vectors(n)
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.integers(0, n, n_queries)] + 0.1 * rng.standard_normal((n_queries, DIM)).astype(np.float32)
+
+        flat = FlatIndex()
+        flat_build = build(flat, vectors)
+        flat_latency, truth = query_latency(flat, queries)
+        report.append({"index": "flat", "size": n, "build_s": flat_build, "query_ms": flat_latency * 1000, "recall_at_1": 1.0})
+
+        for nprobe in nprobes:
+            ivf = IVFIndex(nprobe=nprobe)
+            ivf_build = build(ivf, vectors)
+            ivf_latency, found = query_latency(ivf, queries)
+            recall = sum(a == b for a, b in zip(found, truth)) / n_queries
+            report.append({"index": "ivf", "nprobe": nprobe, "size": n, "build_s": ivf_build, "query_ms": ivf_latency * 1000, "recall_at_1": recall})
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
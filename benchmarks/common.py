@@ -0,0 +1,139 @@
+# shared helpers for the offline benchmarks, nothing here touches the network or loads a real model
+import hashlib
+import os
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+import numpy as np
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet",
+         "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango"]
+
+
+def timed(fn: Callable, repeat: int = 3) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"min_s": min(runs), "median_s": statistics.median(runs), "repeat": repeat}
+
+
+def make_value(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+
+
+def typo(rng: random.Random, value: str) -> str:
+    pos = rng.randrange(len(value))
+    return value[:pos] + rng.choice(string.ascii_lowercase) + value[pos + 1:]
+
+
+def make_sqlite_db(tables: int, columns: int, rows: int, distinct: int = 100, seed: int = 0) -> str:
+    """
+    Creates a throwaway sqlite file and returns its connection string. Every table after the first
+    references the previous one so reflection sees foreign keys, half the extra columns are text
+    drawn from `distinct` values and half are integers.
+    """
+    rng = random.Random(seed)
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="orac_bench_")
+    os.close(fd)
+    pool = [make_value(rng, i) for i in range(distinct)]
+
+    conn = sqlite3.connect(path)
+    for t in range(tables):
+        cols = ["id INTEGER PRIMARY KEY"]
+        if t:
+            cols.append(f"parent_id INTEGER REFERENCES t{t - 1}(id)")
+        cols += [f"c{c} {'TEXT' if c % 2 == 0 else 'INTEGER'}" for c in range(columns)]
+        conn.execute(f"CREATE TABLE t{t} ({', '.join(cols)})")
+
+        def row(i):
+            values = [i] + ([rng.randint(0, max(rows - 1, 0))] if t else [])
+            values += [rng.choice(pool) if c % 2 == 0 else rng.randint(0, 1000) for c in range(columns)]
+            return values
+
+        placeholders = ", ".join("?" * (columns + 1 + bool(t)))
+        conn.executemany(f"INSERT INTO t{t} VALUES ({placeholders})", (row(i) for i in range(rows)))
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def remove_db(connection_string: str):
+    from utils.engine import CONNECTION_CATALOG, ENGINE_CACHE, METADATA_STORAGE
+    from utils.identity import connection_keys
+
+    identity, credential = connection_keys(connection_string)
+    engine = ENGINE_CACHE.pop(credential, None)
+    if engine is not None:
+        engine.dispose()
+    METADATA_STORAGE.pop(identity, None)
+    CONNECTION_CATALOG.pop(identity, None)
+    path = connection_string.replace("sqlite:///", "", 1)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class StubEncoder:
+    """
+    Stands in for SentenceTransformer. Values are hashed character trigrams, so strings that differ
+    by a typo still land close together and semantic_search behaves roughly like the real model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            h = int.from_bytes(hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest(), "little")
+            vec[h % self.dim] += 1
+        return vec
+
+    def encode(self, texts, batch_size: int = 32, **_):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(t) for t in texts]) if texts else np.empty((0, self.dim), dtype=np.float32)
+
+
+@contextmanager
+def stub_store(model=None):
+    """Installs an EmbeddingStore singleton backed by the stub encoder for the duration of the block."""
+    from utils.semantic import EmbeddingStore
+
+    previous = EmbeddingStore._instance
+    EmbeddingStore._instance = None
+    store = EmbeddingStore(model or StubEncoder())
+    EmbeddingStore._instance = store
+    try:
+        yield store
+    finally:
+        EmbeddingStore._instance = previous
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+@contextmanager
+def stub_llm(module, replies: List[str]):
+    """Replaces generateResponse in a route module with canned replies, cycled in order."""
+    original = module.generateResponse
+    calls = {"n": 0}
+
+    def fake(prompt: str):
+        calls["n"] += 1
+        return _StubResponse(replies[(calls["n"] - 1) % len(replies)])
+
+    module.generateResponse = fake
+    try:
+        yield calls
+    finally:
+        module.generateResponse = original
@@ -0,0 +1,167 @@
+# benchmarks for the request hot paths, each returns a list of json friendly result rows
+import random
+
+from benchmarks.common import WORDS, make_sqlite_db, make_value, remove_db, stub_llm, stub_store, timed, typo
+
+
+def bench_metadata(sizes, repeat: int = 3):
+    from utils.engine import get_db_metadata, get_engine, get_stats
+
+    report = []
+    for tables, columns, rows in sizes:
+        conn_str = make_sqlite_db(tables, columns, rows)
+        try:
+            engine = get_engine(conn_str)
+            full = timed(lambda: get_db_metadata(conn_str), repeat)
+            stats = timed(lambda: get_stats(engine, "t0"), repeat)
+            report.append({"tables": tables, "columns": columns, "rows": rows,
+                           "get_db_metadata": full, "get_stats_one_table": stats})
+        finally:
+            remove_db(conn_str)
+    return report
+
+
+def bench_embeddings(cardinalities, rows: int, n_queries: int = 200, repeat: int = 1):
+    from utils.engine import get_db_metadata, get_engine
+
+    report = []
+    rng = random.Random(1)
+    for distinct in cardinalities:
+        conn_str = make_sqlite_db(1, 2, rows, distinct=distinct)
+        try:
+            engine = get_engine(conn_str)
+            metadata = get_db_metadata(conn_str)
+
+            def generate():
+                with stub_store() as store:
+                    store.generate_embeddings(engine, conn_str, metadata)
+                    return store
+
+            build = timed(generate, repeat)
+            with stub_store() as store:
+                store.generate_embeddings(engine, conn_str, metadata)
+                values = [e["value"] for e in store.get_embeddings(conn_str, "t0", "c0")]
+                queries = [typo(rng, rng.choice(values)) for _ in range(n_queries)]
+                search = timed(lambda: [store.semantic_search(conn_str, "t0", "c0", q) for q in queries], repeat)
+
+            report.append({"distinct_values": distinct, "rows": rows, "embedded_values": len(values),
+                           "generate_embeddings": build,
+                           "semantic_search_ms": search["median_s"] / n_queries * 1000})
+        finally:
+            remove_db(conn_str)
+    return report
+
+
+def _query_corpus(n: int, seed: int = 2):
+    rng = random.Random(seed)
+    shapes = [
+        "SELECT * FROM t0 WHERE c0 = '{v}'",
+        "SELECT id, c1 FROM t0 WHERE c0 = '{v}' AND c1 > {i} ORDER BY c1",
+        "SELECT t1.id FROM t1 JOIN t0 ON t1.parent_id = t0.id WHERE t0.c0 = '{v}' AND t1.c2 = '{w}'",
+        "SELECT c0, COUNT(*) FROM t0 WHERE c1 < {i} GROUP BY c0",
+    ]
+    return [rng.choice(shapes).format(v=typo(rng, make_value(rng, i % 100)), w=rng.choice(WORDS), i=i)
+            for i in range(n)]
+
+
+def bench_rewrite(corpus_sizes, repeat: int = 3):
+    from routes.execute import patch_query_with_semantics
+    from utils import logger
+
+    report = []
+    conn_str = make_sqlite_db(2, 3, 500)
+    try:
+        from utils.engine import get_db_metadata, get_engine
+        engine = get_engine(conn_str)
+        metadata = get_db_metadata(conn_str)
+        with stub_store() as store:
+            store.generate_embeddings(engine, conn_str, metadata)
+            for n in corpus_sizes:
+                corpus = _query_corpus(n)
+                patch = timed(lambda: [patch_query_with_semantics(conn_str, q) for q in corpus], repeat)
+
+                class _Conn:
+                    info = {}
+
+                def log_all():
+                    logger.QUERY_LOG.clear()
+                    for q in corpus:
+                        logger.before_execute(_Conn, q, None, None)
+                        logger.after_execute(_Conn, q, None, None, None)
+
+                log = timed(log_all, repeat)
+                logger.QUERY_LOG.clear()
+                report.append({"queries": n,
+                               "patch_query_with_semantics_ms": patch["median_s"] / n * 1000,
+                               "after_execute_ms": log["median_s"] / n * 1000})
+    finally:
+        remove_db(conn_str)
+    return report
+
+
+def bench_execute(result_sizes, repeat: int = 3):
+    from routes.execute import execute_query
+
+    report = []
+    conn_str = make_sqlite_db(1, 6, max(result_sizes))
+    try:
+        with stub_store():
+            for n in result_sizes:
+                run = timed(lambda: execute_query(conn_str, f"SELECT * FROM t0 LIMIT {n}"), repeat)
+                report.append({"result_rows": n, "columns": 7, "execute_query": run})
+    finally:
+        remove_db(conn_str)
+    return report
+
+
+def bench_routes(tables_list, repeat: int = 3):
+    # end to end /graph path with the llm stubbed out: catalog lookup, prompt rendering, join lookup, execution
+    import routes.graph as graph_route
+    from utils.engine import get_catalog
+
+    report = []
+    for tables in tables_list:
+        conn_str = make_sqlite_db(tables, 4, 200)
+        try:
+            catalog = get_catalog(conn_str)
+            reply = '{"message": "m", "query": "SELECT c0, COUNT(*) FROM t0 GROUP BY c0", "type": "bar"}'
+            with stub_store(), stub_llm(graph_route, [reply]):
+                run = timed(lambda: graph_route.get_graph("count t0 by c0 joined with t1", None, catalog, conn_str), repeat)
+            report.append({"tables": tables, "get_graph": run, "prompt_chars": len(catalog.prompt_json())})
+        finally:
+            remove_db(conn_str)
+    return report
+
+
+def bench_ann(sizes, nprobes):
+    from benchmarks.ann_bench import run
+    return run(sizes=sizes, nprobes=nprobes)
+
+
+# quick sizes keep a full run under a minute, the default sizes are what releases get compared on
+SUITES = {
+    "metadata": (
+        lambda: bench_metadata([(5, 4, 1000), (20, 8, 1000)], repeat=1),
+        lambda: bench_metadata([(10, 5, 1000), (50, 10, 10000), (200, 10, 1000), (50, 40, 10000)]),
+    ),
+    "embeddings": (
+        lambda: bench_embeddings([100, 1000], rows=2000),
+        lambda: bench_embeddings([100, 1000, 10000, 50000], rows=60000),
+    ),
+    "rewrite": (
+        lambda: bench_rewrite([100], repeat=1),
+        lambda: bench_rewrite([100, 1000, 5000]),
+    ),
+    "execute": (
+        lambda: bench_execute([1000, 10000], repeat=1),
+        lambda: bench_execute([1000, 10000, 100000]),
+    ),
+    "routes": (
+        lambda: bench_routes([5], repeat=1),
+        lambda: bench_routes([10, 100, 500]),
+    ),
+    "ann": (
+        lambda: bench_ann((1000, 10000), (1, 8)),
+        lambda: bench_ann((1000, 10000, 50000), (1, 4, 8, 16)),
+    ),
+}
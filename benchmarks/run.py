@@ -0,0 +1,62 @@
+# offline benchmark runner, writes one json document so results can be diffed between releases
+# python -m benchmarks.run [--quick] [--only metadata,embeddings] [--output bench.json]
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# the llm is stubbed but utils.aiAPI still builds a client on import
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks.hot_paths import SUITES
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark metadata, embedding, rewriting and execution hot paths")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--only", default="", help=f"comma separated subset of {','.join(SUITES)}")
+    parser.add_argument("--output", default="", help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in args.only.split(",") if s] or list(SUITES)
+    unknown = [s for s in selected if s not in SUITES]
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(unknown)}")
+
+    results = {}
+    for name in selected:
+        quick, full = SUITES[name]
+        start = time.perf_counter()
+        results[name] = {"rows": (quick if args.quick else full)(), "wall_s": time.perf_counter() - start}
+        print(f"[bench] {name} done in {results[name]['wall_s']:.1f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from sqlalchemy.exc import SQLAlchemyError
 import logging
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Dict, Optional
+from typing import AsyncGenerator, Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
 from utils.schema import Metadata, TableSchema
-from utils.engine import validate_connection, dispose_all_engines, get_db_metadata
+from utils.engine import validate_connection, release_connection, dispose_all_engines, register_catalog, resolve_catalog
+from utils.semantic import EmbeddingStore
+from utils.tracing import start_trace, observe_request, render_metrics, start_profiling, stop_profiling, dump_profile, traced, SLOW_REQUEST_PROFILE_MS
 
 from routes.execute import execute_query
 from routes.nlp2sql import get_sql
@@ -33,15 +37,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ROUTE_PATHS = set()
+
+# per request stage timings, reported back as Server-Timing and aggregated for /metrics
+# handlers that do blocking work (db, llm, embeddings) are plain def so FastAPI runs them in its threadpool
+# instead of stalling the event loop, @traced binds that thread to the request for the profiler.
+# Since they run concurrently, the state they share is locked where it lives: the registries in utils/engine.py,
+# EmbeddingStore and its vector indexes, the query log, the docs cache and the tracing histograms.
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    trace = start_trace()
+    profiling = start_profiling(trace)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+    finally:
+        elapsed = trace.elapsed()
+        if not ROUTE_PATHS:
+            ROUTE_PATHS.update(route.path for route in app.routes)
+        # unknown paths share one label so scanners can't blow up the metric cardinality
+        route = request.url.path if request.url.path in ROUTE_PATHS else "unmatched"
+        observe_request(request.method, route, status, elapsed)
+        if profiling:
+            stop_profiling(trace)
+            if elapsed * 1000 >= SLOW_REQUEST_PROFILE_MS:
+                path = dump_profile(trace, route.strip("/").replace("/", "_") or "root")
+                logging.warning("Slow request %s %s took %.0fms, profile written to %s", request.method, route, elapsed * 1000, path)
+
 class ValidateRequest(BaseModel):
     connection_string: str
 
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
     return {"message":"working and stuff"}
 
 @app.post("/validate_connection")
-async def validateConnection(request: ValidateRequest):
+@traced
+def validateConnection(request: ValidateRequest):
 
     connection_string = request.connection_string
     if not connection_string:
@@ -49,13 +89,29 @@ async def validateConnection(request: ValidateRequest):
     
     return validate_connection(connection_string)
 
+# releases what validate_connection acquired, shared metadata and embeddings go once nobody uses the database
+@app.post("/disconnect")
+@traced
+def disconnect(request: ValidateRequest):
+    connection_string = request.connection_string
+    if not connection_string:
+        return {"success": False, "message":"Connection string is empty"}
+    try:
+        released = release_connection(connection_string)
+    except SQLAlchemyError as e:
+        return {"success": False, "message": str(e)}
+    if not released:
+        return {"success": False, "message":"Connection is not open"}
+    return {"success": True}
+
 class QueryRequest(BaseModel):
     connection_string: str
     query: str
 
 #move this to its own file later
 @app.post("/execute_query")
-async def executeQuery(request: QueryRequest):
+@traced
+def executeQuery(request: QueryRequest):
     connection_string = request.connection_string
     query = request.query
 
@@ -66,62 +122,88 @@ async def executeQuery(request: QueryRequest):
 
 class NLPRequest(BaseModel):
     description: str
-    connection_string: Optional[str]
-    local_schema: Optional[Dict[str, TableSchema]]
+    connection_string: Optional[str] = None
+    local_schema: Optional[Dict[str, TableSchema]] = None
+    schema_id: Optional[str] = None
+
+def local_metadata(schema: Optional[Dict[str, TableSchema]]) -> Optional[Metadata]:
+    return Metadata(local_schema=schema, stats={}) if schema else None
 
 @app.post("/nlp2sql")
-async def getSQL(request: NLPRequest):
+@traced
+def getSQL(request: NLPRequest):
     description = request.description
     connection_string = request.connection_string
-    schema = request.local_schema
-    if not schema:
-        schema = get_db_metadata(connection_string).get("local_schema")
-    return get_sql(description, schema, connection_string)
+    catalog = resolve_catalog(connection_string, request.schema_id, local_metadata(request.local_schema))
+    if not catalog:
+        return {"success": False, "message":"Not enough data"}
+    return get_sql(description, catalog, connection_string)
 
 class DocsRequest(BaseModel):
-    connection_string: Optional[str]
-    local_schema: Optional[Dict[str, TableSchema]]
+    connection_string: Optional[str] = None
+    local_schema: Optional[Dict[str, TableSchema]] = None
+    schema_id: Optional[str] = None
 
 @app.post("/docs")
-async def genDocs(request: DocsRequest):
+@traced
+def genDocs(request: DocsRequest):
     connection_string = request.connection_string
-    schema = request.local_schema
-    if not connection_string and not schema:
-        return {"success": False, "message": "Field connection_string or schema is missing"}
-    #need some better edge case handling here in case metadata.get() returns None
-    return gen_docs(schema or get_db_metadata(connection_string).get("local_schema"))
+    catalog = resolve_catalog(connection_string, request.schema_id, local_metadata(request.local_schema))
+    if not catalog:
+        return {"success": False, "message": "Field connection_string, schema or schema_id is missing"}
+    return gen_docs(catalog)
 
 class ChatRequest(BaseModel):
     userInput: str
     query: Optional[str]
-    connection_string: Optional[str]
-    metadata: Optional[Metadata]
+    connection_string: Optional[str] = None
+    metadata: Optional[Metadata] = None
+    schema_id: Optional[str] = None
 
 @app.post("/chat")
-async def getReply(request: ChatRequest):
+@traced
+def getReply(request: ChatRequest):
     userInput = request.userInput
     query = request.query
     connection_string = request.connection_string
-    metadata = request.metadata
-    if metadata:
-        #done because its not json serilizable by default and contains pydantic models
-        metadata = metadata.model_dump()
-    if not connection_string and not metadata:
+    catalog = resolve_catalog(connection_string, request.schema_id, request.metadata)
+    if not catalog:
         return {"success": False, "message":"Not enough data"}
-    return get_reply(userInput, query, metadata or get_db_metadata(connection_string))
+    return get_reply(userInput, query, catalog)
 
 @app.post("/graph")
-async def getGraph(request: ChatRequest):
+@traced
+def getGraph(request: ChatRequest):
     userInput = request.userInput
     query = request.query
     connection_string = request.connection_string
-    metadata = request.metadata
-    if metadata:
-        #done because its not json serilizable by default and contains pydantic models
-        metadata = metadata.model_dump()
-    if not connection_string and not metadata:
+    catalog = resolve_catalog(connection_string, request.schema_id, request.metadata)
+    if not catalog:
         return {"success": False, "message":"Not enough data"}
-    return get_graph(userInput, query, metadata or get_db_metadata(connection_string), connection_string)
+    return get_graph(userInput, query, catalog, connection_string)
+
+class JoinPathRequest(BaseModel):
+    tables: List[str]
+    connection_string: Optional[str] = None
+    metadata: Optional[Metadata] = None
+    schema_id: Optional[str] = None
+
+@app.post("/join_path")
+@traced
+def getJoinPath(request: JoinPathRequest):
+    catalog = resolve_catalog(request.connection_string, request.schema_id, request.metadata)
+    if not catalog:
+        return {"success": False, "message":"Not enough data"}
+    return {"success": True, "data": catalog.schema_graph.join_subgraph(request.tables)}
+
+class SchemaRequest(BaseModel):
+    metadata: Metadata
+
+# register a schema once and refer to it by schema_id afterwards instead of reposting it
+@app.post("/schema")
+async def registerSchema(request: SchemaRequest):
+    catalog = register_catalog(request.metadata)
+    return {"success": True, "schema_id": catalog.schema_id}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:
@@ -129,6 +211,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     try:
         logging.info("Shutting down, closing all database connections...")
         dispose_all_engines()
+        if EmbeddingStore._instance is not None:
+            EmbeddingStore._instance.close()
     except Exception as e:
         logging.exception("Failed during shutdown: %s", str(e))
 
@@ -1,10 +1,12 @@
 from typing import Optional, Dict, Any
 import json
 from utils.aiAPI import generateResponse
-from utils.schema import Metadata
+from utils.catalog import Catalog
 
-def get_reply(userInput: str, query: Optional[str], metadata: Metadata) -> Dict[str, Any]:
-    metadata = json.dumps(metadata, indent=2)
+def get_reply(userInput: str, query: Optional[str], catalog: Catalog) -> Dict[str, Any]:
+    metadata = catalog.prompt_json()
+    schema_graph = catalog.schema_graph
+    joins = schema_graph.describe_joins(schema_graph.referenced_tables(query, userInput))
     prompt = f"""
     You are an SQL assistant named Oraca specialized in SQLite. You must always respond in JSON format with two fields:
     - "message": A clear and concise explanation, modification, or response to the user's request.
@@ -13,6 +15,8 @@ def get_reply(userInput: str, query: Optional[str], metadata: Metadata) -> Dict[
     ## Context:
     - Database schema:
       {metadata}
+    - Join conditions between the referenced tables (prefer these over guessing joins):
+      {joins}
     - Always use SQLite syntax.
     - If the query references nonexistent tables or columns, inform the user instead of assuming.
     - Ensure queries are correct, efficient, and safe.
@@ -1,6 +1,12 @@
-from typing import Dict
+import contextvars
+import hashlib
 import json
-from utils.schema import TableSchema
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+from cachetools import LRUCache
+from utils.catalog import Catalog, Table
 from utils.aiAPI import generateResponse
 
 #schema_types = get_types()
@@ -29,40 +35,108 @@ block_note_block_types = [
     },
 ]
 
-def gen_docs(schema: Dict[str, TableSchema]):
+# one section per table, keyed by a hash of everything its prompt is built from so unchanged tables are never regenerated
+DOCS_CACHE: LRUCache = LRUCache(maxsize=int(os.getenv("DOCS_CACHE_SIZE", "2048")))
+# one pool for the process so DOCS_CONCURRENCY bounds llm calls across all /docs requests
+DOCS_CONCURRENCY = int(os.getenv("DOCS_CONCURRENCY", "4"))
+DOCS_EXECUTOR = ThreadPoolExecutor(max_workers=DOCS_CONCURRENCY, thread_name_prefix="docs")
+# sections being generated, a request missing the same one waits on it instead of asking the llm again
+IN_FLIGHT: Dict[str, Future] = {}
+# guards DOCS_CACHE (cachetools isn't thread safe) and IN_FLIGHT
+_docs_lock = threading.RLock()
+
+def table_hash(table: Table, related: List[str]) -> str:
+    key = [table.name, table.schema_dict(), sorted(related)]
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def gen_table_docs(table: Table, related: List[str]) -> List[Dict[str, Any]]:
+    schema = json.dumps({table.name: table.schema_dict()}, indent=2)
     prompt = f"""
-    You are an AI specialized in generating structured database documentation in strict compliance with the BlockNote block format. Your task is to produce industry-standard documentation explaining all fields of the table and general information, while adhering to the provided database schema, and explicitly allowed block types. Also include a few sample queries in the code block for each table and write the explanations for these queries in a paragraph block. When you wish to add a gap between two topics and two SQL queries, simply use an empty paragraph block.
+    You are an AI specialized in generating structured database documentation in strict compliance with the BlockNote block format. Your task is to produce industry-standard documentation for a single table of a larger database, explaining all fields of the table and general information, while adhering to the provided table schema, and explicitly allowed block types. Also include a few sample queries in the code block and write the explanations for these queries in a paragraph block. When you wish to add a gap between two topics and two SQL queries, simply use an empty paragraph block.
 
     Rules & Constraints
-    - Output must be a valid JSON object strictly following the BlockNote block format.
+    - Output must be a valid JSON object of the form {{"blocks": [...]}} strictly following the BlockNote block format.
+    - Start with a level 2 heading containing the table name, this section is placed inside the documentation of the whole database.
     - Do not generate or include any block types other than those explicitly provided.
-    - Do not introduce extra fields beyond those defined in the database schema.
+    - Do not introduce extra fields beyond those defined in the table schema.
     - Do not introduce extra data types beyond those defined in the supported data types.
     - Maintain readability and logical structuring while staying within BlockNote's JSON format.
     - Your response must contain JSON only.
 
     Provided Information
-    Database Schema
+    Table Schema
     {schema}
 
+    Tables it joins with (only mention them, they are documented separately)
+    {", ".join(related) if related else "None"}
+
     Allowed Block Types (Use only these, no others)
     {block_note_block_types}
 
     Important: If a required structure cannot be represented using the allowed block types, do not attempt to create new block types—strictly use only what is provided. If a concept cannot be documented using the available blocks, omit it instead of introducing new ones.
     """
 
-    try:
-        result = generateResponse(prompt).text
-        # Clean the response by removing markdown code block markers you must remove the newline characters or they obstruct backtick removal
-        result = result.strip().strip("`")
-
-        if result.startswith("json"):
-            result = result[4:].strip()
-        
-        cleaned_json = json.loads(result)
-        return {"success": True, "data": cleaned_json["blocks"]}
-
-    except json.JSONDecodeError:
-        return {"success": False, "message": "Failed to parse JSON response"}
-    except Exception as e:
-        return {"success": False, "message": f"Failed to generate docs: {str(e)}"}
+    result = generateResponse(prompt).text
+    # Clean the response by removing markdown code block markers you must remove the newline characters or they obstruct backtick removal
+    result = result.strip().strip("`")
+
+    if result.startswith("json"):
+        result = result[4:].strip()
+
+    return json.loads(result)["blocks"]
+
+def table_docs(key: str, table: Table, related: List[str]) -> Future:
+    with _docs_lock:
+        if key in DOCS_CACHE:
+            cached = Future()
+            cached.set_result(DOCS_CACHE[key])
+            return cached
+        future = IN_FLIGHT.get(key)
+        if future is None:
+            # copy_context so the llm time still lands in the trace of the request that started it
+            future = DOCS_EXECUTOR.submit(contextvars.copy_context().run, gen_table_docs, table, related)
+            IN_FLIGHT[key] = future
+            future.add_done_callback(lambda done: _finish(key, done))
+        return future
+
+def _finish(key: str, future: Future):
+    with _docs_lock:
+        IN_FLIGHT.pop(key, None)
+        if future.exception() is None:
+            DOCS_CACHE[key] = future.result()
+
+def gen_docs(catalog: Catalog):
+    graph = catalog.schema_graph.graph
+    futures = {}
+    for name, table in catalog.tables.items():
+        related = sorted(graph.neighbors(name))
+        futures[name] = table_docs(table_hash(table, related), table, related)
+
+    sections = {}
+    failed = {}
+    for name, future in futures.items():
+        try:
+            sections[name] = future.result()
+        except json.JSONDecodeError:
+            failed[name] = "Failed to parse JSON response"
+        except Exception as e:
+            failed[name] = f"Failed to generate docs: {str(e)}"
+
+    if failed and len(failed) == len(catalog.tables):
+        return {"success": False, "message": next(iter(failed.values()))}
+
+    blocks = [
+        {"type": "heading", "content": "Database Documentation", "props": {"level": 1}},
+        {"type": "paragraph", "content": f"Tables: {', '.join(catalog.tables)}"},
+        {"type": "paragraph", "content": ""},
+    ]
+    for name in catalog.tables:
+        if name in failed:
+            continue
+        blocks.extend(sections[name])
+        blocks.append({"type": "paragraph", "content": ""})
+
+    response = {"success": True, "data": blocks}
+    if failed:
+        response["failed"] = failed
+    return response
@@ -4,6 +4,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
 from utils.engine import get_engine
 from utils.semantic import EmbeddingStore
+from utils.tracing import stage
 import sqlglot
 from sqlglot.expressions import Where, EQ, Column, Literal
 
@@ -38,15 +39,18 @@ def patch_query_with_semantics(connection_string: str, query: str) -> str:
 def execute_query(connection_string: str, query: str):
     try:
         engine = get_engine(connection_string)
-        patched_query = patch_query_with_semantics(connection_string, query)
+        with stage("sql_rewrite"):
+            patched_query = patch_query_with_semantics(connection_string, query)
         with engine.connect() as connection:
             with connection.begin():
                 start_time = time.perf_counter()
-                result = connection.execute(text(patched_query))
+                with stage("db"):
+                    result = connection.execute(text(patched_query))
                 duration = time.perf_counter() - start_time
 
                 if result.returns_rows:
-                    data = [dict(row) for row in result.mappings()]
+                    with stage("serialize"):
+                        data = [dict(row) for row in result.mappings()]
                     return {"success": True, "data": data, "duration": duration, "query": patched_query}
 
                 return {"success": True, "message": "Query executed successfully", "duration": duration, "query": patched_query}
@@ -1,7 +1,7 @@
 from typing import Optional, Dict, Any
 import json
 from utils.aiAPI import generateResponse
-from utils.schema import Metadata
+from utils.catalog import Catalog
 from routes.execute import execute_query
 
 class GraphResponse:
@@ -9,8 +9,10 @@ class GraphResponse:
     query: str
     type: str
 
-def get_graph(userInput: str, query: Optional[str], metadata: Metadata, connection_string: str) -> Dict[str, Any]:
-    metadata = json.dumps(metadata, indent=2)
+def get_graph(userInput: str, query: Optional[str], catalog: Catalog, connection_string: str) -> Dict[str, Any]:
+    metadata = catalog.prompt_json()
+    schema_graph = catalog.schema_graph
+    joins = schema_graph.describe_joins(schema_graph.referenced_tables(query, userInput))
     structure = {
         "message": "<Brief explanation of the query>",
         "query": "<Generated SQL query>",
@@ -30,6 +32,9 @@ def get_graph(userInput: str, query: Optional[str], metadata: Metadata, connecti
     Database Schema:
     {metadata}
 
+    Join conditions between the referenced tables (prefer these over guessing joins):
+    {joins}
+
     **VERY IMPORTANT**:Your response MUST always be in JSON format with the following structure and use double quotes:
     {structure}
 
@@ -1,6 +1,5 @@
-from typing import Dict
-from utils.schema import TableSchema
 from utils.aiAPI import generateResponse
+from utils.catalog import Catalog
 from routes.execute import execute_query
 # fallback method to ensure the returned query is syntactically correct
 def is_select_query(query: str) -> bool:
@@ -49,13 +48,19 @@ def verify_query(connection_string: str, query: str):
     except Exception as e:
         return {"success": False, "message": f"Failed to generate SQL: {str(e)}"}    
 
-def get_sql(description: str, schema: Dict[str, TableSchema], connection_string: str):
+def get_sql(description: str, catalog: Catalog, connection_string: str):
+    schema = catalog.schema_json()
+    schema_graph = catalog.schema_graph
+    joins = schema_graph.describe_joins(schema_graph.referenced_tables(None, description))
     prompt = f"""
     You are an AI specialized in converting natural language to strict SQL queries.
 
     Database Schema:
     {schema}
 
+    Join conditions between the referenced tables:
+    {joins}
+
     Rule:
     - Follow the schema exactly.
 
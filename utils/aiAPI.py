@@ -1,6 +1,7 @@
 from google import genai
 from dotenv import load_dotenv
 import os
+from utils.tracing import stage
 
 load_dotenv()
 
@@ -8,10 +9,11 @@ client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
 def generateResponse(prompt:str):
     try:
-        response = client.models.generate_content(
-            model="gemini-1.5-flash",
-            contents=prompt,
-        )
+        with stage("llm"):
+            response = client.models.generate_content(
+                model="gemini-1.5-flash",
+                contents=prompt,
+            )
         return response
     except Exception as e:
         raise RuntimeError(f"Error occured: {str(e)}")
\ No newline at end of file
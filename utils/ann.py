@@ -0,0 +1,182 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# vectors are normalised on insert so cosine similarity is a plain dot product
+# an index is filled by validate_connection while other requests on the same database search it,
+# inserts (including retraining) and searches hold the index lock so a search never sees half an update
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class VectorIndex:
+    """Base index, stores one vector per key and the value it was encoded from."""
+
+    def __init__(self):
+        self._keys: Dict[str, int] = {}
+        self._values: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def add(self, key: str, value: str, vector: np.ndarray):
+        self.add_batch([key], [value], np.asarray(vector)[None, :])
+
+    def add_batch(self, keys: List[str], values: List[str], vectors: np.ndarray):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1))
+        with self._lock:
+            rows = []
+            for key, value, vector in zip(keys, values, vectors):
+                if key in self._keys:
+                    continue
+                row = self._append(vector)
+                self._keys[key] = row
+                self._values.append(value)
+                rows.append(row)
+            if rows:
+                self._on_insert(rows)
+
+    def _append(self, vector: np.ndarray) -> int:
+        if self._vectors is None:
+            self._vectors = np.empty((64, vector.shape[0]), dtype=np.float32)
+        elif self._size == len(self._vectors):
+            # grow by doubling so incremental inserts stay amortised O(1)
+            grown = np.empty((len(self._vectors) * 2, self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size] = vector
+        self._size += 1
+        return self._size - 1
+
+    def items(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"value": self._values[row], "embedding": self._vectors[row]}
+                for row in range(self._size)
+            ]
+
+    def search(self, query: np.ndarray, k: int = 1) -> List[Tuple[str, float]]:
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            if not self._size:
+                return []
+            rows = self._candidate_rows(query)
+            vectors = self._vectors[:self._size] if rows is None else self._vectors[rows]
+            if not len(vectors):
+                return []
+
+            scores = vectors @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            ids = top if rows is None else rows[top]
+            return [(self._values[i], float(scores[j])) for i, j in zip(ids, top)]
+
+    def _on_insert(self, rows: List[int]):
+        pass
+
+    # None means scan every row
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        return None
+
+
+class FlatIndex(VectorIndex):
+    """Exact linear scan, fine for a few thousand values per column."""
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted file index, vectors are bucketed under k-means centroids and a query only scans the
+    nprobe closest buckets. Higher nprobe means better recall and slower lookups.
+    Below train_size values it behaves like FlatIndex since a scan is cheap there anyway.
+    """
+
+    def __init__(self, nprobe: int = 8, train_size: int = 2048, nlist: Optional[int] = None, kmeans_iters: int = 10, seed: int = 0):
+        super().__init__()
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.nlist = nlist
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+        self._trained_at = 0
+
+    def _on_insert(self, rows: List[int]):
+        if self._centroids is None:
+            if self._size >= self.train_size:
+                self._train()
+            return
+
+        # retrain once the index doubles so buckets don't drift out of balance
+        if self._size >= 2 * self._trained_at:
+            self._train()
+            return
+
+        assignments = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+        for row, bucket in zip(rows, assignments):
+            self._lists[bucket].append(row)
+            self._list_arrays[bucket] = None
+
+    def _train(self):
+        data = self._vectors[:self._size]
+        nlist = min(self.nlist or max(1, int(math.sqrt(self._size))), self._size)
+        rng = np.random.default_rng(self.seed)
+
+        # k-means on a sample is plenty for picking buckets
+        sample_size = min(self._size, nlist * 64)
+        sample = data[rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+
+        for _ in range(self.kmeans_iters):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            # empty buckets keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = _normalize(sums[filled])
+
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=nlist))[:-1]
+
+        self._centroids = centroids
+        self._lists = [bucket.tolist() for bucket in np.split(order, bounds)]
+        self._list_arrays = [None] * nlist
+        self._trained_at = self._size
+
+    def _list_array(self, bucket: int) -> np.ndarray:
+        if self._list_arrays[bucket] is None:
+            self._list_arrays[bucket] = np.asarray(self._lists[bucket], dtype=np.int64)
+        return self._list_arrays[bucket]
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self._centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._list_array(bucket) for bucket in probe])
+
+
+INDEX_TYPES = {
+    "flat": FlatIndex,
+    "ivf": IVFIndex,
+}
+
+def make_index(kind: str = "ivf", **params) -> VectorIndex:
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {list(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params)
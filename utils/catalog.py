@@ -0,0 +1,170 @@
+import hashlib
+import json
+import sys
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from utils.schema import Metadata, TableSchema, TableStats
+from utils.schema_graph import SchemaGraph
+
+# Internal, immutable view of Metadata. Built and validated once per connection (or per posted schema),
+# names are interned so thousands of tables sharing column names like "id" don't each hold a copy,
+# and the json/prompt renderings are built lazily and cached on the object. Concurrent requests may both
+# build one, they come out identical so whichever is stored last wins without a lock.
+
+PROMPT_EXCLUDED_STATS = {"columns": {"__all__": {"min", "max", "most_common"}}}
+
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+
+def _names(names) -> Tuple[str, ...]:
+    return tuple(sys.intern(n) for n in names)
+
+
+class Column(_Frozen):
+    __slots__ = ("name", "type", "nullable")
+
+    def __init__(self, name: str, type: str, nullable: bool):
+        self._set("name", sys.intern(name))
+        self._set("type", sys.intern(type))
+        self._set("nullable", nullable)
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "type": self.type, "nullable": self.nullable}
+
+
+class ForeignKey(_Frozen):
+    __slots__ = ("column", "references_table", "referenced_column")
+
+    def __init__(self, column, references_table: str, referenced_column):
+        self._set("column", _names(column))
+        self._set("references_table", sys.intern(references_table))
+        self._set("referenced_column", _names(referenced_column))
+
+    def to_dict(self) -> Dict:
+        return {"column": list(self.column), "references_table": self.references_table, "referenced_column": list(self.referenced_column)}
+
+
+class Relationship(_Frozen):
+    __slots__ = ("from_table", "from_columns", "to_table", "to_columns")
+
+    def __init__(self, from_table: str, from_columns, to_table: str, to_columns):
+        self._set("from_table", sys.intern(from_table))
+        self._set("from_columns", _names(from_columns))
+        self._set("to_table", sys.intern(to_table))
+        self._set("to_columns", _names(to_columns))
+
+    def to_dict(self) -> Dict:
+        return {"from_table": self.from_table, "from_columns": list(self.from_columns), "to_table": self.to_table, "to_columns": list(self.to_columns)}
+
+
+class Index(_Frozen):
+    __slots__ = ("name", "columns", "unique")
+
+    def __init__(self, name: Optional[str], columns, unique: bool):
+        self._set("name", sys.intern(name) if name else name)
+        self._set("columns", _names(columns))
+        self._set("unique", unique)
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "columns": list(self.columns), "unique": self.unique}
+
+
+class Table(_Frozen):
+    __slots__ = ("name", "columns", "foreign_keys", "relationships", "indexes", "stats", "_columns_by_name")
+
+    def __init__(self, name: str, schema: TableSchema, stats: Optional[TableStats]):
+        self._set("name", sys.intern(name))
+        self._set("columns", tuple(Column(c.name, c.type, c.nullable) for c in schema.columns))
+        self._set("foreign_keys", tuple(ForeignKey(f.column, f.references_table, f.referenced_column) for f in schema.foreign_keys))
+        self._set("relationships", tuple(Relationship(r.from_table, r.from_columns, r.to_table, r.to_columns) for r in schema.relationships))
+        self._set("indexes", tuple(Index(i.name, i.columns, i.unique) for i in schema.indexes))
+        self._set("stats", stats)
+        self._set("_columns_by_name", MappingProxyType({c.name: c for c in self.columns}))
+
+    def column(self, name: str) -> Optional[Column]:
+        return self._columns_by_name.get(name)
+
+    def schema_dict(self) -> Dict:
+        return {
+            "columns": [c.to_dict() for c in self.columns],
+            "foreign_keys": [f.to_dict() for f in self.foreign_keys],
+            "relationships": [r.to_dict() for r in self.relationships],
+            "indexes": [i.to_dict() for i in self.indexes],
+        }
+
+
+class Catalog(_Frozen):
+    __slots__ = ("schema_id", "tables", "_dict", "_json", "_prompt_json", "_schema_json", "_graph")
+
+    def __init__(self, metadata: Metadata):
+        tables = {
+            name: Table(name, schema, metadata.stats.get(name))
+            for name, schema in metadata.local_schema.items()
+        }
+        self._set("tables", MappingProxyType(tables))
+        for slot in ("_dict", "_json", "_prompt_json", "_schema_json", "_graph"):
+            self._set(slot, None)
+        # content hash so the same schema posted twice maps to the same id
+        self._set("schema_id", hashlib.sha256(self.to_json().encode()).hexdigest()[:32])
+
+    @classmethod
+    def from_dict(cls, metadata) -> "Catalog":
+        # the only place a plain dict gets validated, already validated Metadata passes straight through
+        return cls(Metadata.model_validate(metadata))
+
+    def table(self, name: str) -> Optional[Table]:
+        return self.tables.get(name)
+
+    def column(self, table: str, column: str) -> Optional[Column]:
+        t = self.tables.get(table)
+        return t.column(column) if t else None
+
+    @property
+    def local_schema(self) -> Mapping[str, Dict]:
+        return self.to_dict()["local_schema"]
+
+    def to_dict(self) -> Dict:
+        """Metadata shaped dict, callers must treat it as read only since it is shared."""
+        if self._dict is None:
+            self._set("_dict", {
+                "local_schema": {name: t.schema_dict() for name, t in self.tables.items()},
+                "stats": {name: t.stats.model_dump() for name, t in self.tables.items() if t.stats is not None},
+            })
+        return self._dict
+
+    def to_json(self) -> str:
+        if self._json is None:
+            self._set("_json", json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":")))
+        return self._json
+
+    # renderings used inside llm prompts
+    # sampled column values stay out of them, they cost tokens and may hold data the llm shouldn't see
+    def prompt_json(self) -> str:
+        if self._prompt_json is None:
+            self._set("_prompt_json", json.dumps({
+                "local_schema": self.local_schema,
+                "stats": {
+                    name: t.stats.model_dump(exclude=PROMPT_EXCLUDED_STATS)
+                    for name, t in self.tables.items() if t.stats is not None
+                },
+            }, indent=2))
+        return self._prompt_json
+
+    def schema_json(self) -> str:
+        if self._schema_json is None:
+            self._set("_schema_json", json.dumps(self.local_schema, indent=2))
+        return self._schema_json
+
+    @property
+    def schema_graph(self) -> SchemaGraph:
+        if self._graph is None:
+            self._set("_graph", SchemaGraph(self.to_dict()))
+        return self._graph
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import List, Optional
+import numpy as np
+
+# Runs SentenceTransformer in worker processes so inference doesn't hold the web worker's GIL.
+# Callers on any thread submit texts, a dispatcher thread per worker collects whatever arrives within
+# window_ms (up to max_batch texts) into one encode call, the worker writes the vectors into a shared
+# memory block it owns and the dispatcher copies them out. Each worker has one batch in flight at a time
+# so its block is never written while being read. encode blocks its caller, so it is only called from
+# threads (the route handlers run in FastAPI's threadpool), never from the event loop.
+# A worker that dies fails the batch it was running and is started again before the next one.
+
+_STOP = object()
+
+
+def _worker_main(conn, model_path: str, threads: int, max_batch: int):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_path)
+    dim = model.get_sentence_embedding_dimension()
+    shm = shared_memory.SharedMemory(create=True, size=max_batch * dim * 4)
+    out = np.ndarray((max_batch, dim), dtype=np.float32, buffer=shm.buf)
+    conn.send((dim, shm.name))
+
+    try:
+        while True:
+            texts = conn.recv()
+            if texts is None:
+                break
+            try:
+                out[:len(texts)] = model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                conn.send(len(texts))
+            except Exception as e:
+                conn.send(e)
+    finally:
+        del out
+        shm.close()
+        shm.unlink()
+
+
+class _Worker:
+    def __init__(self, ctx, model_path: str, threads: int, max_batch: int):
+        self.args = (ctx, model_path, threads, max_batch)
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, model_path, threads, max_batch), daemon=True)
+        self.process.start()
+        child.close()
+        self.dim, shm_name = self.conn.recv()
+        self.shm = shared_memory.SharedMemory(name=shm_name)
+        self.out = np.ndarray((max_batch, self.dim), dtype=np.float32, buffer=self.shm.buf)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        self.conn.send(texts)
+        reply = self.conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return self.out[:reply].copy()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except (BrokenPipeError, OSError):
+            pass
+        del self.out
+        self.shm.close()
+        if not self.process.is_alive() and self.process.exitcode != 0:
+            # a killed worker never got to unlink its block
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class EmbeddingService:
+    """Drop in for SentenceTransformer.encode backed by a pool of worker processes."""
+
+    def __init__(self, model_path: str, workers: int = 1, threads_per_worker: Optional[int] = None, max_batch: int = 256, window_ms: float = 5):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        # spawn rather than fork, forking a process that already started torch threads can deadlock
+        ctx = mp.get_context("spawn")
+        self._workers = [_Worker(ctx, model_path, threads, max_batch) for _ in range(workers)]
+        self.dim = self._workers[0].dim
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch, args=(i,), daemon=True) for i in range(len(self._workers))
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+        atexit.register(self.close)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size: int = 32, **_):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        # big inputs (generate_embeddings) are split so they can interleave with request traffic
+        futures = []
+        for i in range(0, len(texts), self.max_batch):
+            future = Future()
+            self._queue.put((texts[i:i + self.max_batch], future))
+            futures.append(future)
+        vectors = np.concatenate([f.result() for f in futures])
+        return vectors[0] if single else vectors
+
+    def _dispatch(self, index: int):
+        carry = None
+        while True:
+            item = carry if carry is not None else self._queue.get()
+            carry = None
+            if item is _STOP:
+                return
+            batch = [item]
+            size = len(item[0])
+            # only wait for company when others are already queued, a lone request goes straight out
+            deadline = time.perf_counter() + (self.window if not self._queue.empty() else 0)
+
+            # micro batch whatever else arrives inside the window
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _STOP or size + len(nxt[0]) > self.max_batch:
+                    carry = nxt
+                    break
+                batch.append(nxt)
+                size += len(nxt[0])
+
+            try:
+                worker = self._worker(index)
+                vectors = worker.encode([text for texts, _ in batch for text in texts])
+            except (EOFError, OSError) as e:
+                logging.error("Embedding worker %d died: %s", index, e)
+                # let it finish exiting so the next batch sees it dead and restarts it
+                self._workers[index].process.join(timeout=1)
+                for _, future in batch:
+                    future.set_exception(e)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                offset = 0
+                for texts, future in batch:
+                    future.set_result(vectors[offset:offset + len(texts)])
+                    offset += len(texts)
+
+    def _worker(self, index: int) -> _Worker:
+        worker = self._workers[index]
+        if not worker.alive():
+            worker.close()
+            worker = _Worker(*worker.args)
+            self._workers[index] = worker
+            logging.warning("Embedding worker %d restarted", index)
+        return worker
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._dispatchers:
+            self._queue.put(_STOP)
+        for thread in self._dispatchers:
+            thread.join(timeout=5)
+        for worker in self._workers:
+            worker.close()
+        logging.info("Embedding service stopped")
@@ -1,58 +1,137 @@
-from typing import Dict
+import os
+import threading
+from collections import Counter
+from typing import Dict, Optional
 from sqlalchemy import create_engine, text, Engine, inspect, event
 from sqlalchemy.exc import SQLAlchemyError
+from cachetools import TTLCache
 from utils.schema import Metadata
 from utils.logger import after_execute, before_execute
-import time
 from utils.semantic import EmbeddingStore
+from utils.tracing import stage
+from utils.catalog import Catalog
+from utils.identity import connection_keys, credential_key, identity_key
+from utils.profiler import profile_table
 
 
 # Temporary database
+# engines are per credential, everything derived from the schema is per database identity (see utils/identity.py)
 ENGINE_CACHE: Dict[str, Engine] = {}
 METADATA_STORAGE: Dict[str, Metadata] = {}
+# server held schemas, clients can pass schema_id instead of reposting the whole schema
+# catalogs of validated connections live until the connection is released, posted ones are bounded
+CATALOG_STORAGE: Dict[str, Catalog] = {}
+POSTED_CATALOGS: TTLCache = TTLCache(
+    maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("CATALOG_CACHE_TTL", "3600")),
+)
+CONNECTION_CATALOG: Dict[str, str] = {}
+# handlers run on threadpool threads, the registries above (and the TTLCache, which isn't thread safe)
+# are only touched under this lock. Reflection and catalog building happen outside it.
+_registry_lock = threading.RLock()
+# validate and release of one database run one at a time, so a second validate waits for the first to finish
+# embedding and then shares its results. Kept for the life of the process, one small lock per database seen.
+_identity_locks: Dict[str, threading.Lock] = {}
+
+def _identity_lock(identity: str) -> threading.Lock:
+    with _registry_lock:
+        return _identity_locks.setdefault(identity, threading.Lock())
+# one reference per validate_connection, released by /disconnect
+ENGINE_REFS: Counter = Counter()
+IDENTITY_REFS: Counter = Counter()
 
 def validate_connection(connection_string: str):
-    start_time = time.perf_counter()
     store = EmbeddingStore.get_instance()
     try:
-        engine = get_engine(connection_string)
-
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-
-            #includes the schema of the table and the extra stats
-            metadata = get_db_metadata(connection_string)
-            METADATA_STORAGE[connection_string] = metadata
-            
-            # pass the connection string to create embeddings, cardinality threhold decides which columns get embeddings
-            # 500 embeddings for a row is ok amount to get the embedding count simply multiply the cardinality with the row count so 0.05*10000 would mean 500 values
-
-            # higher threshold means no correction for majority of the columns and too low and you make the application slow and overflow the memory since stored in the cache
-            store.generate_embeddings(engine, connection_string, metadata, 0.4)
-            # developmental
-            # store.printCache()
-
-            #binding after schema because it runs a huge query and it sends through a wall of text QOL change 
-            event.listen(engine, "before_execute", before_execute)
-            event.listen(engine, "after_execute", after_execute)
-            print(time.perf_counter()-start_time)
-        return {"success": True, "data": metadata}
+        identity, credential = connection_keys(connection_string)
+        with _identity_lock(identity):
+            engine = get_engine(connection_string)
+
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+                # an equivalent connection already loaded this database, reuse its metadata and embeddings
+                with _registry_lock:
+                    shared = identity in METADATA_STORAGE and IDENTITY_REFS[identity] > 0
+
+                #includes the schema of the table and the extra stats
+                metadata = get_db_metadata(connection_string)
+                # validated once here, join paths and prompt renderings hang off the catalog
+                catalog = register_catalog(metadata, pinned=True)
+                with _registry_lock:
+                    METADATA_STORAGE[identity] = metadata
+                    CONNECTION_CATALOG[identity] = catalog.schema_id
+                # build the join graph now rather than on the first llm request
+                catalog.schema_graph
+
+                if not shared:
+                    # pass the connection string to create embeddings, every text column gets up to max_values distinct values embedded
+                    # lookups go through the ann index (EMBEDDING_INDEX/EMBEDDING_NPROBE) so large columns don't slow down semantic_search
+                    store.generate_embeddings(engine, connection_string, metadata)
+                # developmental
+                # store.printCache()
+
+                #binding after schema because it runs a huge query and it sends through a wall of text QOL change 
+                if not event.contains(engine, "after_execute", after_execute):
+                    event.listen(engine, "before_execute", before_execute)
+                    event.listen(engine, "after_execute", after_execute)
+
+            with _registry_lock:
+                ENGINE_REFS[credential] += 1
+                IDENTITY_REFS[identity] += 1
+        return {"success": True, "data": metadata, "schema_id": catalog.schema_id}
     except SQLAlchemyError as e:
         return {"success": False, "message": str(e)}
 
+# drops one reference, the engine goes with the last user of its credentials
+# and the metadata, catalog and embeddings with the last user of the database
+def release_connection(connection_string: str) -> bool:
+    identity, credential = connection_keys(connection_string)
+    with _identity_lock(identity):
+        engine = None
+        with _registry_lock:
+            if ENGINE_REFS[credential] <= 0:
+                return False
+
+            ENGINE_REFS[credential] -= 1
+            if ENGINE_REFS[credential] == 0:
+                del ENGINE_REFS[credential]
+                engine = ENGINE_CACHE.pop(credential, None)
+
+            IDENTITY_REFS[identity] -= 1
+            last = IDENTITY_REFS[identity] == 0
+            if last:
+                del IDENTITY_REFS[identity]
+                METADATA_STORAGE.pop(identity, None)
+                schema_id = CONNECTION_CATALOG.pop(identity, None)
+                if schema_id not in CONNECTION_CATALOG.values():
+                    CATALOG_STORAGE.pop(schema_id, None)
+
+        if engine is not None:
+            engine.dispose()
+        if last:
+            EmbeddingStore.get_instance().drop(connection_string)
+    return True
+
 # Function to get or create an engine
 def get_engine(connection_string: str):
-    if connection_string not in ENGINE_CACHE:
-        engine = create_engine(connection_string, pool_size=5, max_overflow=10)
-        ENGINE_CACHE[connection_string] = engine
-    return ENGINE_CACHE[connection_string]
+    key = credential_key(connection_string)
+    with _registry_lock:
+        if key not in ENGINE_CACHE:
+            engine = create_engine(connection_string, pool_size=5, max_overflow=10)
+            ENGINE_CACHE[key] = engine
+        return ENGINE_CACHE[key]
 
 #metadata is schema + stats
 def get_db_metadata(connection_string: str) -> Metadata:
+    metadata = METADATA_STORAGE.get(identity_key(connection_string))
+    if metadata is not None:
+        return metadata
+
+    with stage("metadata"):
+        return _reflect_metadata(connection_string)
 
-    if connection_string in METADATA_STORAGE:
-        return METADATA_STORAGE.get(connection_string)
-    
+def _reflect_metadata(connection_string: str) -> Metadata:
     engine = get_engine(connection_string)
     inspector = inspect(engine)
     schema = {}
@@ -103,8 +182,55 @@ def get_db_metadata(connection_string: str) -> Metadata:
     return {"local_schema": schema, "stats":stats}
 
 
+def register_catalog(metadata: Metadata, pinned: bool = False) -> Catalog:
+    catalog = Catalog.from_dict(metadata)
+    with _registry_lock:
+        return _store_catalog(catalog, pinned)
+
+# caller holds _registry_lock
+def _store_catalog(catalog: Catalog, pinned: bool) -> Catalog:
+    # identical schemas share one catalog so its cached renderings are reused
+    if catalog.schema_id in CATALOG_STORAGE:
+        return CATALOG_STORAGE[catalog.schema_id]
+    if pinned:
+        CATALOG_STORAGE[catalog.schema_id] = POSTED_CATALOGS.pop(catalog.schema_id, catalog)
+        return CATALOG_STORAGE[catalog.schema_id]
+    return POSTED_CATALOGS.setdefault(catalog.schema_id, catalog)
+
+def lookup_catalog(schema_id: str) -> Optional[Catalog]:
+    with _registry_lock:
+        return CATALOG_STORAGE.get(schema_id) or POSTED_CATALOGS.get(schema_id)
+
+def get_catalog(connection_string: str) -> Catalog:
+    identity = identity_key(connection_string)
+    with _registry_lock:
+        schema_id = CONNECTION_CATALOG.get(identity)
+        if schema_id in CATALOG_STORAGE:
+            return CATALOG_STORAGE[schema_id]
+    catalog = Catalog.from_dict(get_db_metadata(connection_string))
+    with _registry_lock:
+        # connections that were never validated hold no reference, so their catalog goes in the bounded cache
+        pinned = IDENTITY_REFS[identity] > 0
+        catalog = _store_catalog(catalog, pinned)
+        if pinned:
+            CONNECTION_CATALOG[identity] = catalog.schema_id
+    return catalog
+
+# schema_id wins, then posted metadata, then whatever is cached for the connection
+# a schema_id that has expired falls through to the other sources
+def resolve_catalog(connection_string: Optional[str] = None, schema_id: Optional[str] = None, metadata: Optional[Metadata] = None) -> Optional[Catalog]:
+    catalog = lookup_catalog(schema_id) if schema_id else None
+    if catalog:
+        return catalog
+    if metadata:
+        return register_catalog(metadata)
+    if connection_string:
+        return get_catalog(connection_string)
+    return None
+
+
 def get_stats(engine, table_name):
-    stats = {"row_count": 0, "cardinality": {}}
+    stats = {"row_count": 0, "cardinality": {}, "sample_size": 0, "columns": {}}
 
     with engine.connect() as conn:
         try:
@@ -112,13 +238,10 @@ def get_stats(engine, table_name):
             row_count = conn.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
             stats["row_count"] = row_count
 
-            # Get cardinality for each column
-            inspector = inspect(engine)
-            columns = [col["name"] for col in inspector.get_columns(table_name)]
-
-            for col in columns:
-                unique_count = conn.execute(text(f"SELECT COUNT(DISTINCT {col}) FROM {table_name}")).scalar()
-                stats["cardinality"][col] = unique_count / row_count if row_count else 0
+            # everything else comes from one sample instead of a COUNT(DISTINCT) scan per column
+            stats.update(profile_table(engine, table_name, row_count))
+            for col, profile in stats["columns"].items():
+                stats["cardinality"][col] = profile["distinct"] / row_count if row_count else 0
 
         except Exception as e:
             print(f"Error fetching stats for {table_name}: {e}")
@@ -126,6 +249,10 @@ def get_stats(engine, table_name):
     return stats
 
 def dispose_all_engines():
-    for _, engine in ENGINE_CACHE.items():
-        engine.dispose()
-    ENGINE_CACHE.clear()
\ No newline at end of file
+    with _registry_lock:
+        engines = list(ENGINE_CACHE.values())
+        ENGINE_CACHE.clear()
+        ENGINE_REFS.clear()
+        IDENTITY_REFS.clear()
+    for engine in engines:
+        engine.dispose()
\ No newline at end of file
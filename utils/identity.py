@@ -0,0 +1,68 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Tuple
+from sqlalchemy.engine import make_url
+
+# Connection strings are split into two keys:
+# - identity, which database this is (backend, host, port, database and the url parameters that pick a
+#   database or schema). Metadata, catalogs and embeddings are keyed by it so tenants pointing at the same
+#   database share them.
+# - credential, identity plus driver, user, password and all url parameters. Engines are keyed by it since
+#   pools must not be shared across credentials.
+# Parameter order, host case, default ports and driver suffixes don't change the identity. When the url
+# doesn't say which host and database it is (dsn or odbc_connect only urls) the identity is the credential,
+# so nothing is shared on a guess.
+
+DEFAULT_PORTS = {
+    "postgresql": 5432,
+    "mysql": 3306,
+    "mariadb": 3306,
+    "mssql": 1433,
+    "oracle": 1521,
+}
+
+# url parameters that change which database or schema a connection sees, compared case insensitively
+DATABASE_PARAMS = {
+    "odbc_connect", "dsn", "database", "dbname", "db", "catalog", "schema", "currentschema",
+    "search_path", "options", "service_name", "sid", "service",
+}
+
+
+@lru_cache(maxsize=1024)
+def connection_keys(connection_string: str) -> Tuple[str, str]:
+    url = make_url(connection_string)
+    backend = url.get_backend_name()
+    database = url.database or ""
+    query = sorted((k, v if isinstance(v, str) else ",".join(v)) for k, v in url.query.items())
+    selecting = [(k, v) for k, v in query if k.lower() in DATABASE_PARAMS]
+
+    if backend == "sqlite":
+        # in memory databases are private to their engine so they are never shared
+        if database in ("", ":memory:") or database.startswith("file::memory:"):
+            identity = f"sqlite://memory/{_digest(connection_string)}"
+        else:
+            identity = f"sqlite:///{os.path.realpath(database)}"
+    else:
+        host = (url.host or "").lower()
+        port = url.port or DEFAULT_PORTS.get(backend, "")
+        identity = f"{backend}://{host}:{port}/{database}"
+        if selecting:
+            identity += "?" + "&".join(f"{k.lower()}={v}" for k, v in selecting)
+
+    credential = _digest(repr((identity, url.drivername, url.username, url.password, query)))
+    if backend != "sqlite" and not (url.host and (database or selecting)):
+        identity = f"{backend}://credential/{credential}"
+    return identity, credential
+
+
+def identity_key(connection_string: str) -> str:
+    return connection_keys(connection_string)[0]
+
+
+def credential_key(connection_string: str) -> str:
+    return connection_keys(connection_string)[1]
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
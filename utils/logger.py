@@ -1,7 +1,10 @@
+import threading
 import time
 from sqlglot import parse, parse_one, expressions
 
 QUERY_LOG = {}
+# queries finish on many request threads at once, entries are created and bumped under this lock
+_log_lock = threading.Lock()
 
 def before_execute(conn, _clauseelement, _multiparams, _params):
     conn.info["query_start_time"] = time.time()
@@ -26,18 +29,19 @@ def after_execute(conn, clauseelement, _multiparams, _params, _result):
             #print(f"Failed to parse query columns: {e}")
             where_cols, join_cols, order_by_cols = [], [], []
 
-        if query_hash not in QUERY_LOG:
-            QUERY_LOG[query_hash] = {
-                "query": query,
-                "execution_time": elapsed,
-                "frequency": 1,
-                "where_columns": where_cols,
-                "join_columns": join_cols,
-                "order_by_columns": order_by_cols
-            }
-        else:
-            QUERY_LOG[query_hash]["execution_time"] += elapsed
-            QUERY_LOG[query_hash]["frequency"] += 1
+        with _log_lock:
+            if query_hash not in QUERY_LOG:
+                QUERY_LOG[query_hash] = {
+                    "query": query,
+                    "execution_time": elapsed,
+                    "frequency": 1,
+                    "where_columns": where_cols,
+                    "join_columns": join_cols,
+                    "order_by_columns": order_by_cols
+                }
+            else:
+                QUERY_LOG[query_hash]["execution_time"] += elapsed
+                QUERY_LOG[query_hash]["frequency"] += 1
         #debugging
         #print(QUERY_LOG[query_hash])
 
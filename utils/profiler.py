@@ -0,0 +1,140 @@
+import os
+import random
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, List
+import numpy as np
+from sqlalchemy import text, Engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Column profiling from one bounded random sample per table instead of a COUNT(DISTINCT) scan per column.
+# Tables that fit in the sample are read whole so their numbers are exact.
+
+STATS_SAMPLE_SIZE = int(os.getenv("STATS_SAMPLE_SIZE", "10000"))
+# up to this many rows a table is sampled with ORDER BY random(), a scan that is cheap at that size and exactly
+# uniform. Bigger tables are sampled without reading them whole where the database allows it (see sample_query).
+STATS_SORT_SAMPLE_ROWS = int(os.getenv("STATS_SORT_SAMPLE_ROWS", "100000"))
+MOST_COMMON = 5
+MAX_VALUE_LENGTH = 200
+
+RANDOM_ORDER = {
+    "postgresql": "random()",
+    "sqlite": "random()",
+    "mysql": "RAND()",
+    "mariadb": "RAND()",
+}
+
+
+def sample_query(dialect: str, table: str, row_count: int, size: int) -> str:
+    """
+    A random sample of about size rows. Nothing is cut off with an early LIMIT, that would keep the rows
+    stored first. Samples that come back larger than size are trimmed by profile_table.
+    """
+    if row_count <= size:
+        return f"SELECT * FROM {table}"
+    if row_count <= STATS_SORT_SAMPLE_ROWS:
+        if dialect in RANDOM_ORDER:
+            return f"SELECT * FROM {table} ORDER BY {RANDOM_ORDER[dialect]} LIMIT {size}"
+        if dialect == "mssql":
+            return f"SELECT TOP {size} * FROM {table} ORDER BY NEWID()"
+
+    if dialect == "postgresql":
+        # SYSTEM reads only the sampled pages. Rows on a page come together, so sample twice what's needed
+        # and let profile_table pick from them.
+        return f"SELECT * FROM {table} TABLESAMPLE SYSTEM ({min(100.0, size / row_count * 200):.4f})"
+    if dialect == "mssql":
+        # page level like postgres SYSTEM
+        return f"SELECT * FROM {table} TABLESAMPLE ({min(100.0, size / row_count * 200):.4f} PERCENT)"
+    if dialect == "sqlite":
+        # random rowids between the smallest and largest one, each is an index seek. Gaps in the rowids make
+        # it come back a little short.
+        rowid = f"(SELECT min(rowid) FROM {table}) + abs(random()) % ((SELECT max(rowid) - min(rowid) + 1 FROM {table}))"
+        return (
+            f"WITH RECURSIVE draw(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM draw WHERE n < {int(size * 1.2)}) "
+            f"SELECT * FROM {table} WHERE rowid IN (SELECT {rowid} FROM draw)"
+        )
+    if dialect in ("mysql", "mariadb"):
+        # no page sampling, one pass with a per row filter is the best available
+        return f"SELECT * FROM {table} WHERE RAND() < {min(1.0, size / row_count * 1.2):.6f}"
+    # no sampling primitive we know of, first rows is biased but still bounded
+    return f"SELECT * FROM {table} LIMIT {size}"
+
+
+def estimate_distinct(counts: np.ndarray, sample_rows: int, row_count: int) -> float:
+    """GEE estimator, values seen once in the sample are scaled up by sqrt(N/n), repeated ones counted as is."""
+    if sample_rows == 0:
+        return 0.0
+    if sample_rows >= row_count:
+        return float(len(counts))
+    singletons = int(np.count_nonzero(counts == 1))
+    if singletons == len(counts) == counts.sum():
+        # nothing repeated in the sample, most likely a unique column (same call postgres makes)
+        return float(row_count * counts.sum() / sample_rows)
+    return float(min(row_count, np.sqrt(row_count / sample_rows) * singletons + (len(counts) - singletons)))
+
+
+def profile_column(values: List, row_count: int) -> Dict:
+    sample_rows = len(values)
+    nulls = np.fromiter((v is None for v in values), dtype=bool, count=sample_rows)
+    present = [v for v, is_null in zip(values, nulls) if not is_null]
+    profile = {
+        "null_fraction": float(nulls.mean()) if sample_rows else 0.0,
+        "distinct": 0.0,
+        "min": None,
+        "max": None,
+        "most_common": [],
+        "avg_length": None,
+    }
+    if not present:
+        return profile
+
+    first = present[0]
+    frequencies = None
+    if isinstance(first, (int, float, Decimal)) and not isinstance(first, bool):
+        try:
+            keys = np.asarray(present, dtype=np.float64)
+            profile["min"], profile["max"] = float(keys.min()), float(keys.max())
+            uniques, counts = np.unique(keys, return_counts=True)
+            frequencies = Counter(dict(zip(uniques.tolist(), counts.tolist())))
+        except (TypeError, ValueError):
+            # sqlite lets a numeric column hold text, profile it as text instead
+            frequencies = None
+    if frequencies is None:
+        # a plain list and Counter, a numpy string array would pad every value to the longest one
+        keys = [str(v) for v in present]
+        if isinstance(first, str):
+            profile["avg_length"] = sum(len(k) for k in keys) / len(keys)
+        # dates and strings compare fine as text, iso formats sort chronologically
+        profile["min"], profile["max"] = _clip(min(keys)), _clip(max(keys))
+        frequencies = Counter(keys)
+
+    profile["most_common"] = [
+        {"value": _clip(value), "frequency": count / sample_rows}
+        for value, count in frequencies.most_common(MOST_COMMON)
+    ]
+    counts = np.fromiter(frequencies.values(), dtype=np.int64, count=len(frequencies))
+    profile["distinct"] = estimate_distinct(counts, sample_rows, row_count)
+    return profile
+
+
+def _clip(value):
+    return value[:MAX_VALUE_LENGTH] if isinstance(value, str) else value
+
+
+def profile_table(engine: Engine, table: str, row_count: int, sample_size: int = STATS_SAMPLE_SIZE) -> Dict:
+    with engine.connect() as conn:
+        result = conn.execute(text(sample_query(engine.dialect.name, table, row_count, sample_size)))
+        columns = list(result.keys())
+        rows = result.fetchall()
+    if len(rows) > sample_size:
+        rows = random.sample(rows, sample_size)
+
+    # column major so every profile works on one flat list
+    by_column = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        "sample_size": len(rows),
+        "columns": {col: profile_column(list(values), row_count) for col, values in zip(columns, by_column)},
+    }
+
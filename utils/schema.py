@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
 
 class ColumnSchema(BaseModel):
     name: str
@@ -28,9 +28,24 @@ class TableSchema(BaseModel):
     relationships: List[RelationshipSchema]
     indexes: List[IndexSchema]
 
+class ValueFrequency(BaseModel):
+    value: Union[float, str]
+    frequency: float
+
+# computed from a random sample of the table, see utils/profiler.py
+class ColumnProfile(BaseModel):
+    null_fraction: float
+    distinct: float
+    min: Optional[Union[float, str]] = None
+    max: Optional[Union[float, str]] = None
+    most_common: List[ValueFrequency] = []
+    avg_length: Optional[float] = None
+
 class TableStats(BaseModel):
     row_count: int
     cardinality: Dict[str, float]
+    sample_size: int = 0
+    columns: Dict[str, ColumnProfile] = {}
 
 class Metadata(BaseModel):
     local_schema: Dict[str, TableSchema]
@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Dict, List, Optional, Set
+import re
+import networkx as nx
+import sqlglot
+from sqlglot import expressions
+
+from utils.schema import Metadata
+
+class SchemaGraph:
+    """
+    Foreign key graph of a schema, built once per metadata so join paths don't have to be rederived
+    from the json on every request. Tables are nodes, each edge holds the relationships between its two tables.
+    """
+
+    def __init__(self, metadata: Metadata):
+        schema = metadata.get("local_schema") or {}
+        self.graph = nx.Graph()
+        self.graph.add_nodes_from(schema.keys())
+
+        for table, table_data in schema.items():
+            for rel in table_data.get("relationships", []):
+                if rel["to_table"] not in schema:
+                    continue
+                if not self.graph.has_edge(rel["from_table"], rel["to_table"]):
+                    self.graph.add_edge(rel["from_table"], rel["to_table"], joins=[])
+                self.graph.edges[rel["from_table"], rel["to_table"]]["joins"].append(rel)
+
+        # no all pairs paths, that is quadratic in tables. join paths are a bfs over the sparse fk graph on demand
+        self.component_of: Dict[str, int] = {
+            table: i for i, component in enumerate(nx.connected_components(self.graph)) for table in component
+        }
+
+    def _nearest(self, tree: Set[str], targets: Set[str]) -> Optional[List[str]]:
+        """Multi source bfs from every table in tree, returns the path from the closest target back into the tree."""
+        parent = {node: None for node in tree}
+        frontier = deque(tree)
+        while frontier:
+            node = frontier.popleft()
+            if node in targets:
+                path = [node]
+                while parent[path[-1]] is not None:
+                    path.append(parent[path[-1]])
+                return path
+            for neighbour in self.graph.adj[node]:
+                if neighbour not in parent:
+                    parent[neighbour] = node
+                    frontier.append(neighbour)
+        return None
+
+    def join_subgraph(self, tables: List[str]) -> Dict:
+        """
+        Minimal set of joins connecting the given tables. Greedy steiner tree, each step attaches the remaining
+        table closest to the tree through its shortest path, one bfs per attached table.
+        Tables that can't be reached from the rest are returned under "unreachable".
+        """
+        tables = [t for t in dict.fromkeys(tables) if t in self.graph]
+        if not tables:
+            return {"tables": [], "joins": [], "unreachable": []}
+
+        tree = {tables[0]}
+        edges = set()
+        component = self.component_of[tables[0]]
+        unreachable = [t for t in tables[1:] if self.component_of[t] != component]
+        remaining = {t for t in tables[1:] if self.component_of[t] == component}
+
+        while remaining:
+            path = self._nearest(tree, remaining)
+            for a, b in zip(path, path[1:]):
+                edges.add(tuple(sorted((a, b))))
+            tree.update(path)
+            remaining -= tree
+
+        joins = [rel for a, b in sorted(edges) for rel in self.graph.edges[a, b]["joins"]]
+        return {"tables": sorted(tree), "joins": joins, "unreachable": unreachable}
+
+    def referenced_tables(self, query: Optional[str], text: Optional[str] = None) -> List[str]:
+        """Tables named in the sql query or mentioned by name in the free text."""
+        found = []
+        if query:
+            try:
+                for ast in sqlglot.parse(query):
+                    found.extend(t.name for t in ast.find_all(expressions.Table))
+            except Exception:
+                pass
+        words = set(re.findall(r"\w+", f"{query or ''} {text or ''}".lower()))
+        found.extend(t for t in self.graph if t.lower() in words)
+        return [t for t in dict.fromkeys(found) if t in self.graph]
+
+    def describe_joins(self, tables: List[str]) -> str:
+        """Join conditions connecting the tables, one per line, for prompt building."""
+        lines = []
+        for rel in self.join_subgraph(tables)["joins"]:
+            lines.append(" AND ".join(
+                f"{rel['from_table']}.{a} = {rel['to_table']}.{b}"
+                for a, b in zip(rel["from_columns"], rel["to_columns"])
+            ))
+        return "\n".join(lines) if lines else "None"
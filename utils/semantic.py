@@ -1,90 +1,116 @@
 import hashlib
+import threading
 from typing import Dict, List
-import numpy as np
-from sentence_transformers import SentenceTransformer
 from sqlalchemy import text, Engine
 
 from utils.schema import Metadata
+from utils.ann import VectorIndex, make_index
+from utils.embedding_service import EmbeddingService
+from utils.identity import identity_key
+from utils.tracing import stage
 import logging
 import os
 from dotenv import load_dotenv
 load_dotenv()
 class EmbeddingStore:
     _instance = None
+    # construction starts the worker processes and takes seconds, concurrent first requests must not each build one
+    _instance_lock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, model=None):
         if EmbeddingStore._instance is not None:
             raise Exception("Use EmbeddingStore.get_instance() to access the singleton.")
         logging.basicConfig(level=logging.DEBUG)
-        model_path = os.path.join(os.getcwd(), "models", "all-MiniLM-L6-v2")
-        self.model = SentenceTransformer(model_path)
-        # Structure: {conn_hash: { "table.col": {value_hash: {value, embedding}}}}
-        self.cache: Dict[str, Dict[str, Dict[str, Dict[str, np.ndarray]]]] = {}
+        # model can be swapped for anything with a compatible encode(), the benchmarks use a stub
+        if model is None:
+            model_path = os.path.join(os.getcwd(), "models", "all-MiniLM-L6-v2")
+            # inference runs in EMBEDDING_WORKERS separate processes, 0 keeps the model inline in the web worker
+            workers = int(os.getenv("EMBEDDING_WORKERS", "1"))
+            if workers > 0:
+                model = EmbeddingService(
+                    model_path,
+                    workers=workers,
+                    threads_per_worker=int(os.getenv("EMBEDDING_THREADS", "0")) or None,
+                    window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")),
+                )
+            else:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_path)
+        self.model = model
+        # flat is the exact scan, ivf trades a little recall for sublinear lookups on big columns
+        self.index_kind = os.getenv("EMBEDDING_INDEX", "ivf")
+        self.index_params = {"nprobe": int(os.getenv("EMBEDDING_NPROBE", "8"))} if self.index_kind == "ivf" else {}
+        # Structure: {conn_hash: { "table.col": VectorIndex keyed by value_hash}}
+        self.cache: Dict[str, Dict[str, VectorIndex]] = {}
+        # guards the two dict levels of cache, each index has its own lock for its contents
+        self._cache_lock = threading.Lock()
 
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = EmbeddingStore()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = EmbeddingStore()
         return cls._instance
 
     def _hash(self, text: str) -> str:
         return hashlib.sha256(text.encode()).hexdigest()
 
+    # keyed by database identity so equivalent connections (other credentials, param order) share embeddings
     def _conn_key(self, connection_string: str) -> str:
-        return self._hash(connection_string)
+        return self._hash(identity_key(connection_string))
 
-    def has_value(self, connection_str: str, table: str, column: str, value: str) -> bool:
-        conn_key = self._conn_key(connection_str)
+    def drop(self, connection_string: str):
+        with self._cache_lock:
+            self.cache.pop(self._conn_key(connection_string), None)
+
+    def _get_index(self, connection_string: str, table: str, column: str, create: bool = False) -> VectorIndex:
+        conn_key = self._conn_key(connection_string)
         col_key = f"{table}.{column}"
-        value_hash = self._hash(value)
+        with self._cache_lock:
+            if create:
+                columns = self.cache.setdefault(conn_key, {})
+                if col_key not in columns:
+                    columns[col_key] = make_index(self.index_kind, **self.index_params)
+            return self.cache.get(conn_key, {}).get(col_key)
 
-        return (
-            conn_key in self.cache and
-            col_key in self.cache[conn_key] and
-            value_hash in self.cache[conn_key][col_key]
-        )
+    def has_value(self, connection_str: str, table: str, column: str, value: str) -> bool:
+        index = self._get_index(connection_str, table, column)
+        return index is not None and self._hash(value) in index
 
     def add_value(self, connection_string: str, table: str, column: str, value: str):
-        conn_key = self._conn_key(connection_string)
-        col_key = f"{table}.{column}"
-        value_hash = self._hash(value)
+        self.add_values(connection_string, table, column, [value])
 
-        self.cache.setdefault(conn_key, {})
-        self.cache[conn_key].setdefault(col_key, {})
-        if value_hash not in self.cache[conn_key][col_key]:
-            embedding = self.model.encode(value)
-            self.cache[conn_key][col_key][value_hash] = {
-                "value": value,
-                "embedding": embedding
-            }
+    def add_values(self, connection_string: str, table: str, column: str, values: List[str]):
+        index = self._get_index(connection_string, table, column, create=True)
+        hashes = [self._hash(value) for value in values]
+        new = [(h, value) for h, value in zip(hashes, values) if h not in index]
+        if not new:
+            return
+        # encoding in one batch is far cheaper than one model call per value
+        with stage("embedding"):
+            embeddings = self.model.encode([value for _, value in new], batch_size=256)
+        index.add_batch([h for h, _ in new], [value for _, value in new], embeddings)
 
     def get_embeddings(self, connection_string: str, table: str, column: str) -> List[Dict]:
-        conn_key = self._conn_key(connection_string)
-        col_key = f"{table}.{column}"
-        return list(self.cache.get(conn_key, {}).get(col_key, {}).values())
+        index = self._get_index(connection_string, table, column)
+        return index.items() if index is not None else []
 
     def semantic_search(self, connection_string: str, table: str, column: str, query: str, threshold: float = 0) -> str:
-        query_vec = self.model.encode(query)
-        candidates = self.get_embeddings(connection_string, table, column)
-
-        if not candidates:
+        index = self._get_index(connection_string, table, column)
+        if not index:
             return query  # fallback
 
-        def cosine(a, b):
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-        best_score = -1
-        best_match = query
-
-        for entry in candidates:
-            score = cosine(query_vec, entry["embedding"])
-            if score > best_score:
-                best_score = score
-                best_match = entry["value"]
+        with stage("embedding"):
+            query_vec = self.model.encode(query)
+            matches = index.search(query_vec, k=1)
+        if not matches:
+            return query
 
+        best_match, best_score = matches[0]
         return best_match if best_score >= threshold else query
 
-    def generate_embeddings(self, engine: Engine, connection_string: str, metadata: Metadata, cardinality_threshold: float = 0.6):
+    def generate_embeddings(self, engine: Engine, connection_string: str, metadata: Metadata, max_values: int = 50000):
         if not metadata or not engine:
             return
         
@@ -102,27 +128,40 @@ class EmbeddingStore:
                     continue
 
                 col_stats = stats.get(table, {})
-                cardinality = col_stats.get("cardinality", {}).get(col_name, 1.0)
                 row_count = col_stats.get("row_count", 0)
 
-                if cardinality > cardinality_threshold or row_count < 50:
+                # high cardinality columns (names, cities, titles) are embedded too since the index keeps lookups sublinear
+                if row_count < 50:
                     continue
 
-                limit = min(500, row_count)
+                profile = col_stats.get("columns", {}).get(col_name)
+                if profile and not self._is_candidate(profile):
+                    continue
+
+                limit = min(max_values, row_count)
 
                 with engine.connect() as connection:
                     try:
                         result = connection.execute(text(
                             f"SELECT DISTINCT {col_name} FROM {table} WHERE {col_name} IS NOT NULL LIMIT {limit}"
                         ))
-                        for row in result:
-                            value = str(row[0])
-                            self.add_value(connection_string, table, col_name, value)
+                        values = [str(row[0]) for row in result]
+                        self.add_values(connection_string, table, col_name, values)
                     except Exception as e:
                         print(f"[embedding] Failed {table}.{col_name}: {e}")
 
+    # mostly empty, constant, or long free text (descriptions, json blobs) columns never get equality filters worth correcting
+    def _is_candidate(self, profile: Dict) -> bool:
+        if profile["null_fraction"] >= 0.95 or profile["distinct"] <= 1:
+            return False
+        return (profile.get("avg_length") or 0) <= 100
+
     def _is_text_type(self, col_type: str) -> bool:
         return any(t in col_type for t in ["text", "char", "varchar", "string"])
 
+    def close(self):
+        if hasattr(self.model, "close"):
+            self.model.close()
+
     def printCache(self):
         print(self.cache)
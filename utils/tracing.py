@@ -0,0 +1,197 @@
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Request scoped stage timings. A Trace is opened per request by the middleware in main.py and every
+# stage() block inside that request adds to it, stages are also fed into process wide histograms for /metrics.
+# Stages can nest (embedding lookups happen inside sql_rewrite) and run in parallel (/docs fans llm calls out
+# over a thread pool) so Server-Timing entries may overlap and add up to more than total.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Trace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = defaultdict(float)
+        # threads currently serving this request, only these are sampled by the profiler
+        self.threads: Set[int] = set()
+        self.samples: Counter = Counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        with _lock:
+            stages = list(self.stages.items())
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("orac_trace", default=None)
+_lock = threading.Lock()
+STAGE_HISTOGRAMS: Dict[str, Histogram] = defaultdict(Histogram)
+REQUEST_HISTOGRAMS: Dict[Tuple[str, str, int], Histogram] = defaultdict(Histogram)
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        trace = _current.get()
+        with _lock:
+            if trace is not None:
+                trace.stages[name] += elapsed
+            STAGE_HISTOGRAMS[name].observe(elapsed)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    with _lock:
+        REQUEST_HISTOGRAMS[(method, route, status)].observe(seconds)
+
+
+def _render(lines, name: str, labels: str, hist: Histogram):
+    cumulative = 0
+    for bound, count in zip(BUCKETS + ("+Inf",), hist.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of the stage and request histograms."""
+    lines = [
+        "# HELP orac_stage_duration_seconds Time spent per request stage (llm, db, sql_rewrite, ...).",
+        "# TYPE orac_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        for name, hist in sorted(STAGE_HISTOGRAMS.items()):
+            _render(lines, "orac_stage_duration_seconds", f'stage="{name}"', hist)
+        lines += [
+            "# HELP orac_request_duration_seconds End to end request latency.",
+            "# TYPE orac_request_duration_seconds histogram",
+        ]
+        for (method, route, status), hist in sorted(REQUEST_HISTOGRAMS.items()):
+            _render(lines, "orac_request_duration_seconds", f'method="{method}",route="{route}",status="{status}"', hist)
+    return "\n".join(lines) + "\n"
+
+
+# Sampling profiler for slow requests, off unless SLOW_REQUEST_PROFILE_MS is set.
+# One background thread samples the threads bound to each in flight trace (see traced()), so a profile only
+# holds stacks of its own request. If the request ends up slower than the threshold the samples are written
+# as collapsed stacks (flamegraph.pl / speedscope format).
+SLOW_REQUEST_PROFILE_MS = float(os.getenv("SLOW_REQUEST_PROFILE_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+
+_profiled: Set[Trace] = set()
+_sampler: Optional[threading.Thread] = None
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _sample_loop():
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        with _lock:
+            targets = [(trace, tid) for trace in _profiled for tid in trace.threads]
+        if not targets:
+            continue
+        frames = sys._current_frames()
+        stacks = [(trace, _collapse(frames[tid])) for trace, tid in targets if tid in frames]
+        with _lock:
+            for trace, stack in stacks:
+                trace.samples[stack] += 1
+
+
+def start_profiling(trace: Trace) -> bool:
+    global _sampler
+    if SLOW_REQUEST_PROFILE_MS <= 0:
+        return False
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, daemon=True)
+            _sampler.start()
+        _profiled.add(trace)
+    return True
+
+
+def stop_profiling(trace: Trace):
+    with _lock:
+        _profiled.discard(trace)
+
+
+def dump_profile(trace: Trace, label: str) -> str:
+    with _lock:
+        samples = trace.samples.most_common()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}.folded")
+    with open(path, "w") as f:
+        for stack, count in samples:
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def traced(fn):
+    """
+    For sync route handlers. FastAPI runs them on a threadpool thread with the request's context copied in,
+    binding that thread to the trace lets the profiler sample it without picking up other requests.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return fn(*args, **kwargs)
+        tid = threading.get_ident()
+        with _lock:
+            trace.threads.add(tid)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _lock:
+                trace.threads.discard(tid)
+    return wrapper